@@ -1,12 +1,40 @@
-import base64
 import json
 import time
+import weakref
+from contextlib import contextmanager
 from decouple import config, UndefinedValueError
 from loguru import logger
-from etebase import Client, Account, Collection, Item, CollectionManager, ItemManager
+from etebase import (
+    Client,
+    Account,
+    Collection,
+    Item,
+    CollectionManager,
+    ItemManager,
+    FetchOptions,
+    PrefetchOption,
+)
 from PIL import Image
 from io import BytesIO
-from typing import Literal, Union, Optional, Any, List, Dict
+from typing import Literal, Union, Optional, Any, List, Dict, Iterator, Tuple
+
+try:
+    # SIMD-accelerated drop-in replacement for the standard library's base64 module
+    import pybase64 as base64
+except ImportError:
+    import base64  # type: ignore[no-redef]
+
+try:
+    # faster JSON library, which encodes straight to bytes and decodes from bytes
+    import orjson
+except ImportError:
+    orjson = None  # type: ignore[assignment]
+
+try:
+    # incremental JSON parser, to iterate over annotations without decoding all of them at once
+    import ijson
+except ImportError:
+    ijson = None  # type: ignore[assignment]
 
 
 ToolboxType = Literal["paintbrush", "spline", "boundingBox"]
@@ -17,6 +45,11 @@ class Project:
         self.project_manager = self._fetch_project_manager(account)
         self.project = None
         self.item_manager = None
+        # decoded project's content and map from the gallery tiles' ids to their index in it
+        self.gallery: Optional[List[Dict[str, Any]]] = None
+        self.tile_index: Optional[Dict[str, int]] = None
+        # number of nested Gliff._with_gallery blocks currently editing the gallery
+        self.gallery_edits = 0
 
     def _fetch_project_data(self, project_uid: str) -> None:
         """Fetch project data if project is not set or has changed."""
@@ -26,8 +59,14 @@ class Project:
             logger.info("fetching project data...")
             self.project = self._fetch_project(self.project_manager, project_uid)
             self.item_manager = self._fetch_item_manager(self.project_manager, self.project)
+            self._clear_gallery_cache()
             logger.success("project data fetched.")
 
+    def _clear_gallery_cache(self) -> None:
+        """Discard the decoded gallery and the tile index."""
+        self.gallery = None
+        self.tile_index = None
+
     @staticmethod
     def _fetch_project_manager(account: Account) -> CollectionManager:
         """Fetch the project manager.
@@ -97,13 +136,24 @@ class Project:
         """Set the project's content."""
         if self.project is not None:
             self.project.content = new_content
+            self._clear_gallery_cache()
             self.project_manager.transaction(self.project)
 
 
 class Gliff:
+    """Client for a STORE account. Use it as a context manager, so that it logs out when done:
+
+    with Gliff(access_key, server_url) as gliff:
+        gliff.upload_image(project_uid, name, image)
+
+    Otherwise, call logout explicitly; an instance still logged in is logged out when it is
+    garbage-collected or at exit, whichever comes first.
+    """
+
     def __init__(self, access_key: Optional[str] = None, server_url: Optional[str] = None) -> None:
         self.account: Optional[Account] = None
         self.project: Optional[Project] = None
+        self._finalizer: "Optional[weakref.finalize[[Account], Gliff]]" = None
 
         if (access_key is not None) & (server_url is not None):
             self.login(access_key, server_url)
@@ -140,25 +190,46 @@ class Gliff:
     def pil_to_base64_image(img_pil: Image.Image, is_thumbnail: Optional[bool] = False) -> str:
         """Convert a PIL Image object to a base64-encoded image (in bytes)"""
 
-        img_file = BytesIO()
-        img_pil.save(img_file, format="PNG")
-        img_bytes = img_file.getvalue()
-        img_base64 = base64.b64encode(img_bytes).decode()
+        img_base64 = Gliff._pil_to_png_base64(img_pil).decode()
         if is_thumbnail:
             img_base64 = f"data:image/png;base64,{img_base64}"
         return img_base64
 
+    @staticmethod
+    def _pil_to_png_base64(img_pil: Image.Image) -> bytes:
+        """Convert a PIL Image object to a base64-encoded PNG, without decoding it to str"""
+
+        img_file = BytesIO()
+        # the fastest deflate level: several times quicker than the default, for slightly larger files
+        img_pil.save(img_file, format="PNG", compress_level=1)
+        return base64.b64encode(img_file.getvalue())
+
+    @staticmethod
+    def _pil_to_webp_data_url(img_pil: Image.Image) -> str:
+        """Convert a PIL Image object to a WebP data URL (faster to encode and smaller than PNG)"""
+
+        img_file = BytesIO()
+        img_pil.save(img_file, format="WEBP", quality=80, method=0)
+        data_url = bytearray(b"data:image/webp;base64,")
+        data_url += base64.b64encode(img_file.getvalue())
+        return data_url.decode("ascii")
+
     def _get_thumbnail_from_pil_image(self, img_pil: Image.Image) -> str:
         """Get base64-encoded thumbnail (in bytes) from PIL image"""
 
         size = 128, 128
-        img_pil.thumbnail(size, Image.ANTIALIAS)
-        return self.pil_to_base64_image(img_pil, True)
+        if img_pil.format == "JPEG":
+            # let the JPEG decoder skip most of the pixels by decoding at a reduced scale
+            img_pil.draft("RGB", (2 * size[0], 2 * size[1]))
+        img_pil.thumbnail(size, Image.Resampling.LANCZOS, reducing_gap=2.0)
+        return self._pil_to_webp_data_url(img_pil)
 
     @staticmethod
     def _decode_content(content: bytes) -> Any:
         """Extract and decode project's or item's content, from binary to Dict."""
         try:
+            if orjson is not None:
+                return orjson.loads(content)
             return json.loads(content.decode())
         except json.JSONDecodeError as e:
             logger.warning(f"Error while accessing the project's content: {e}.")
@@ -166,12 +237,24 @@ class Gliff:
     @staticmethod
     def _encode_content(decoded_content: Any) -> bytes:
         """Encode project's or item's content, from Dict to binary."""
+        if orjson is not None:
+            return orjson.dumps(decoded_content)
         return json.dumps(decoded_content, separators=(",", ":")).encode()
 
+    @classmethod
+    def _encode_appended_content(cls, content: bytes, new_items: List[Any]) -> bytes:
+        """Encode a non-empty list, already encoded as content, with new items appended to it,
+        without encoding the list's existing items again."""
+        if not new_items:
+            return content
+        encoded_items = cls._encode_content(new_items)
+        # drop the list's closing bracket and the new items' opening one
+        return b"".join((content.rstrip()[:-1], b",", encoded_items[1:]))
+
     @staticmethod
     def get_current_time() -> int:
         """Get the current UTC time as an integer number expressed in milliseconds since the epoch."""
-        return int(round(time.time() * 1000))
+        return time.time_ns() // 1_000_000
 
     @staticmethod
     def is_empty_annotation(annotation: Dict[str, Any]) -> bool:
@@ -186,24 +269,16 @@ class Gliff:
             Boolean for wether the annotation passed as input is empty or not.
         """
         return (
-            (len(annotation["spline"]["coordinates"]) == 0)
-            & (len(annotation["brushStrokes"]) == 0)
-            & (annotation["boundingBox"]["coordinates"]["topLeft"]["x"] is None)
+            not annotation["spline"]["coordinates"]
+            and not annotation["brushStrokes"]
+            and annotation["boundingBox"]["coordinates"]["topLeft"]["x"] is None
         )
 
     @staticmethod
     def create_brush_stroke(
         coordinates: List[Union[int, float]],
-        space_time_info: Optional[Dict[str, Any]] = {
-            "z": 0,
-            "t": 0,
-        },
-        brush: Optional[Dict[str, Any]] = {
-            "radius": 0.5,
-            "type": "paint",
-            "color": "rgba(170, 0, 0, 0.5)",
-            "is3D": False,
-        },
+        space_time_info: Optional[Dict[str, Any]] = None,
+        brush: Optional[Dict[str, Any]] = None,
     ) -> Dict[str, Any]:
         """Create a brush stroke annotation.
 
@@ -218,6 +293,16 @@ class Gliff:
             The new brush-stroke object.
         """
 
+        if space_time_info is None:
+            space_time_info = {"z": 0, "t": 0}
+        if brush is None:
+            brush = {
+                "radius": 0.5,
+                "type": "paint",
+                "color": "rgba(170, 0, 0, 0.5)",
+                "is3D": False,
+            }
+
         return {
             "coordinates": coordinates,
             "spaceTimeInfo": space_time_info,
@@ -227,7 +312,7 @@ class Gliff:
     @staticmethod
     def create_spline(
         coordinates: List[Dict[str, Union[int, float]]],
-        space_time_info: Optional[Dict[str, Union[int, float]]] = {"z": 0, "t": 0},
+        space_time_info: Optional[Dict[str, Union[int, float]]] = None,
         is_closed: Optional[bool] = False,
     ) -> Dict[str, Any]:
         """Create a spline annotation.
@@ -244,13 +329,15 @@ class Gliff:
         -------
             The new spline object.
         """
+        if space_time_info is None:
+            space_time_info = {"z": 0, "t": 0}
         return {"coordinates": coordinates, "spaceTimeInfo": space_time_info, "isClosed": is_closed}
 
     @staticmethod
     def create_bounding_box(
         top_left: Dict[str, Union[int, float]],
         bottom_right: Dict[str, Union[int, float]],
-        space_time_info: Optional[Dict[str, Union[int, float]]] = {"z": 0, "t": 0},
+        space_time_info: Optional[Dict[str, Union[int, float]]] = None,
     ) -> Dict[str, Any]:
         """Create a bounding-box annotation.
 
@@ -266,6 +353,8 @@ class Gliff:
         -------
             The new bouding-box object.
         """
+        if space_time_info is None:
+            space_time_info = {"z": 0, "t": 0}
         return {
             "coordinates": {"topLeft": top_left, "bottomRight": bottom_right},
             "spaceTimeInfo": space_time_info,
@@ -279,21 +368,11 @@ class Gliff:
     @staticmethod
     def create_annotation(
         toolbox: ToolboxType,
-        labels: List[str] = [],
-        spline: Optional[Dict[str, Any]] = {
-            "coordinates": [],
-            "spaceTimeInfo": {"z": 0, "t": 0},
-            "isClosed": False,
-        },
-        bounding_box: Optional[Dict[str, Any]] = {
-            "coordinates": {
-                "topLeft": {"x": None, "y": None},
-                "bottomRight": {"x": None, "y": None},
-            },
-            "spaceTimeInfo": {"z": 0, "t": 0},
-        },
-        brush_strokes: Optional[List[Optional[Dict[str, Any]]]] = [],
-        parameters: Optional[Dict[str, Any]] = {},
+        labels: Optional[List[str]] = None,
+        spline: Optional[Dict[str, Any]] = None,
+        bounding_box: Optional[Dict[str, Any]] = None,
+        brush_strokes: Optional[List[Optional[Dict[str, Any]]]] = None,
+        parameters: Optional[Dict[str, Any]] = None,
     ) -> Dict[str, Any]:
         """Create an annotation. Toolbox, the only required parameter, defines the annotation's type,
         which corresponds to the toolbox used for creating it. Depending on the value passed for toolbox,
@@ -320,13 +399,27 @@ class Gliff:
             Annotation (empty by default).
 
         """
+        if spline is None:
+            spline = {
+                "coordinates": [],
+                "spaceTimeInfo": {"z": 0, "t": 0},
+                "isClosed": False,
+            }
+        if bounding_box is None:
+            bounding_box = {
+                "coordinates": {
+                    "topLeft": {"x": None, "y": None},
+                    "bottomRight": {"x": None, "y": None},
+                },
+                "spaceTimeInfo": {"z": 0, "t": 0},
+            }
         return {
             "toolbox": toolbox,
-            "labels": labels,
+            "labels": labels if labels is not None else [],
             "spline": spline,
             "boundingBox": bounding_box,
-            "brushStrokes": brush_strokes,
-            "parameters": parameters,
+            "brushStrokes": brush_strokes if brush_strokes is not None else [],
+            "parameters": parameters if parameters is not None else {},
         }
 
     def _process_image_data(self, image: Union[str, Image.Image]) -> Union[None, Dict[str, Any]]:
@@ -343,11 +436,21 @@ class Gliff:
         """
 
         # check type of image and process it
-        if type(image) == Image.Image:
-            image_pil = image
-            image = self.pil_to_base64_image(image)
+        if isinstance(image, Image.Image):
+            # work on a copy, so that creating the thumbnail does not resize the caller's image
+            image_pil = image.copy()
+            # the base64 alphabet has no characters to escape, so the JSON envelope can be written directly
+            encoded_image = b"".join((b'[["', self._pil_to_png_base64(image), b'"]]'))
         elif isinstance(image, str):
-            image_pil = self.base64_to_pil_image(image)
+            # PIL reads the format and size from the header without decoding pixels
+            image_pil = Image.open(BytesIO(base64.b64decode(image)))
+            if image_pil.format == "PNG":
+                # keep the original base64 payload, as it is already stored as a PNG
+                encoded_image = self._encode_content([[image]])
+            else:
+                # store any other format as an RGB PNG, like images passed as PIL images
+                image_pil = image_pil.convert("RGB")
+                encoded_image = b"".join((b'[["', self._pil_to_png_base64(image_pil), b'"]]'))
         else:
             logger.error("image should be of type PIL.Image.Image or str")
             return None
@@ -357,7 +460,7 @@ class Gliff:
             "width": width,
             "height": height,
             "thumbnail": self._get_thumbnail_from_pil_image(image_pil),
-            "encoded_image": self._encode_content([[image]]),
+            "encoded_image": encoded_image,
         }
 
     def login(self, access_key: str, server_url: str) -> None:
@@ -379,6 +482,9 @@ class Gliff:
         self.account = Account.login(client, username, password)
         logger.success("logged in.")
 
+        # log out on garbage collection or at exit; the callback must not reference the instance
+        self._finalizer = weakref.finalize(self, Gliff._logout_account, self.account)
+
         self._accept_pending_invitations()
 
         self.project = Project(self.account)
@@ -386,11 +492,23 @@ class Gliff:
     def logout(self) -> None:
         """Log out of STORE."""
 
+        if self.account is None:
+            return
+
+        if self._finalizer is not None:
+            self._finalizer.detach()
+            self._finalizer = None
+
+        self._logout_account(self.account)
+        self.account = None
+        self.project = None
+
+    @staticmethod
+    def _logout_account(account: Account) -> None:
+        """Log an account out of STORE."""
+
         logger.info("logging out...")
-        if self.account is not None:
-            self.account.logout()
-            self.account = None
-            self.project = None
+        account.logout()
         logger.success("logged out.")
 
     def _accept_pending_invitations(self) -> None:
@@ -404,7 +522,8 @@ class Gliff:
         for invitation in list(invitations.data):
 
             invit_manager.accept(invitation)
-            logger.success("invitations accepted.")
+
+        logger.success("invitations accepted.")
 
     def _leave_project(self, project_uid: str) -> None:
         """Leave a project.
@@ -419,20 +538,26 @@ class Gliff:
 
             return None
 
-        self.project._fetch_project_data(project_uid)
+        self._ensure_project(project_uid)
 
         logger.info(f"leaving project, uid: {project_uid}...")
         memeber_manager = self.project.project_manager.get_member_manager(self.project.project)
         memeber_manager.leave()
         logger.info("left project.")
 
+    def _ensure_project(self, project_uid: str) -> None:
+        """Fetch the project's data, unless the project with this uid is already the current one."""
+        if (self.project.project is not None) and (self.project.project.uid == project_uid):
+            return
+        self.project._fetch_project_data(project_uid)
+
     def _has_project(self) -> bool:
         if self.project is None:
             logger.warning("Please log in to a STORE account to use this method.")
             return False
         return True
 
-    def get_project_item(self, project_uid: str, item_uid: str) -> Item:
+    def get_project_item(self, project_uid: str, item_uid: str, metadata_only: bool = False) -> Item:
         """Retrieve a project's item.
 
         Parameters
@@ -441,6 +566,8 @@ class Gliff:
             Project's uid.
         item_uid: str
             Item uid.
+        metadata_only: bool
+            Whether to skip downloading the item's content, e.g. to only update its metadata (optional).
         Returns
         -------
         item: Item
@@ -450,11 +577,16 @@ class Gliff:
         if not self._has_project():
             return None
 
-        self.project._fetch_project_data(project_uid)
+        self._ensure_project(project_uid)
 
         try:
             logger.info(f"fetching item, uid: {item_uid}...")
-            item = self.project.item_manager.fetch(item_uid)
+            if metadata_only:
+                # the content's chunks are left on the server; they are kept as they are on upload
+                fetch_options = FetchOptions().prefetch(PrefetchOption.Medium)
+                item = self.project.item_manager.fetch(item_uid, fetch_options)
+            else:
+                item = self.project.item_manager.fetch(item_uid)
             logger.info("item fetched.")
             return item
         except Exception as e:
@@ -463,10 +595,10 @@ class Gliff:
     @staticmethod
     def _create_tile_update(
         image_labels: Optional[List[str]] = None,
-        metadata: Dict[str, Any] = {},
-        annotation_uid: Dict[str, str] = {},
-        audit_uid: Dict[str, str] = {},
-        annotation_complete: Dict[str, bool] = {},
+        metadata: Optional[Dict[str, Any]] = None,
+        annotation_uid: Optional[Dict[str, str]] = None,
+        audit_uid: Optional[Dict[str, str]] = None,
+        annotation_complete: Optional[Dict[str, bool]] = None,
     ) -> Dict[str, Any]:
         """Create gallery tile with data to update.
 
@@ -490,10 +622,10 @@ class Gliff:
         """
 
         tile = {
-            "fileInfo": metadata,
-            "annotationUID": annotation_uid,
-            "auditUID": audit_uid,
-            "annotationComplete": annotation_complete,
+            "fileInfo": metadata if metadata is not None else {},
+            "annotationUID": annotation_uid if annotation_uid is not None else {},
+            "auditUID": audit_uid if audit_uid is not None else {},
+            "annotationComplete": annotation_complete if annotation_complete is not None else {},
         }
 
         if image_labels is not None:
@@ -505,11 +637,11 @@ class Gliff:
     def _create_new_tile(
         image_item_uid: str,
         thumbnail: str,
-        image_labels: List[str] = [],
-        metadata: Dict[str, Any] = {},
-        annotation_uid: Dict[str, str] = {},
-        audit_uid: Dict[str, str] = {},
-        annotation_complete: Dict[str, bool] = {},
+        image_labels: Optional[List[str]] = None,
+        metadata: Optional[Dict[str, Any]] = None,
+        annotation_uid: Optional[Dict[str, str]] = None,
+        audit_uid: Optional[Dict[str, str]] = None,
+        annotation_complete: Optional[Dict[str, bool]] = None,
     ) -> Dict[str, Any]:
         """Create new gallery tile.
 
@@ -536,15 +668,16 @@ class Gliff:
             Gallery tile (empty by default).
         """
 
+        # the arguments are copied, so that callers cannot change the tile once it is in the cached gallery
         return {
             "id": image_item_uid,
             "thumbnail": thumbnail,
-            "imageLabels": image_labels,
-            "fileInfo": metadata,
+            "imageLabels": list(image_labels) if image_labels is not None else [],
+            "fileInfo": dict(metadata) if metadata is not None else {},
             "imageUID": image_item_uid,
-            "annotationUID": annotation_uid,
-            "auditUID": audit_uid,
-            "annotationComplete": annotation_complete,
+            "annotationUID": dict(annotation_uid) if annotation_uid is not None else {},
+            "auditUID": dict(audit_uid) if audit_uid is not None else {},
+            "annotationComplete": dict(annotation_complete) if annotation_complete is not None else {},
         }
 
     def _create_gallery_tile(self, tile: Dict[str, Any]) -> None:
@@ -559,28 +692,56 @@ class Gliff:
         logger.info("updating gallery's content..")
 
         try:
-            gallery = self._get_gallery()
-
-            gallery.append(tile)
-
-            self._set_gallery(gallery)
+            with self._with_gallery() as gallery:
+                gallery.append(tile)
+                if self.project.tile_index is not None:
+                    self.project.tile_index[tile["id"]] = len(gallery) - 1
         except Exception as e:
             logger.error(f"Error while creating a gallery's tile: {e}")
 
     def _get_gallery(self) -> List[Dict[str, Any]]:
-        return self._decode_content(self.project.content)
+        """Get the decoded gallery, which is cached until the project's content changes."""
+        if self.project.gallery is None:
+            self.project.gallery = self._decode_content(self.project.content)
+        return self.project.gallery
 
     @staticmethod
-    def _find_gallery_tile(gallery: List[Dict[str, Any]], id: str) -> Union[int, None]:
+    def _index_gallery(gallery: List[Dict[str, Any]]) -> Dict[str, int]:
+        """Map the id of each gallery tile to the tile's index in the gallery."""
+        return {tile["id"]: i for i, tile in enumerate(gallery)}
+
+    def _find_gallery_tile(self, gallery: List[Dict[str, Any]], id: str) -> Union[int, None]:
         """Get the index for the gallery tile corresponding to the image item with
         uid equal to the galler's id (or equal to the imageUID field)."""
-        for i, tile in enumerate(gallery):
-            if tile["id"] == id:
-                return i
-        return None
+        if self.project.tile_index is None:
+            self.project.tile_index = self._index_gallery(gallery)
+        return self.project.tile_index.get(id)
 
     def _set_gallery(self, gallery: List[Dict[str, Any]]) -> None:
         self.project.content = self._encode_content(gallery)
+        self.project.gallery = gallery
+        self.project.tile_index = self._index_gallery(gallery)
+
+    @contextmanager
+    def _with_gallery(self) -> Iterator[List[Dict[str, Any]]]:
+        """Yield the decoded gallery to be edited in place and save it on exit.
+
+        Nested blocks share the same gallery, which is only encoded and uploaded once,
+        when the outermost block exits.
+        """
+
+        gallery = self._get_gallery()
+        self.project.gallery_edits += 1
+        try:
+            yield gallery
+            if self.project.gallery_edits == 1:
+                self._set_gallery(gallery)
+        except Exception:
+            if self.project.gallery_edits == 1:
+                self.project._clear_gallery_cache()
+            raise
+        finally:
+            self.project.gallery_edits -= 1
 
     def _update_gallery_tile(self, item_uid: str, tile_data: Dict[str, Any]) -> None:
         """Update a tile in the STORE project.
@@ -592,17 +753,27 @@ class Gliff:
             Gallery tile data.
         """
 
+        self._update_gallery_tiles_bulk([(item_uid, tile_data)])
+
+    def _update_gallery_tiles_bulk(self, tile_updates: List[Tuple[str, Dict[str, Any]]]) -> None:
+        """Update several tiles in the STORE project, with a single update of the gallery.
+        Parameters
+        ----------
+        tile_updates: List[Tuple[str, Dict]]
+            Item uid (the item is of type gliff.image) and gallery tile data for each update.
+        """
+
         def update_tile(
             tile: Dict[str, Any],
-            metadata: Optional[Dict[str, Any]] = None,
+            fileInfo: Optional[Dict[str, Any]] = None,
             annotationUID: Optional[Dict[str, str]] = None,
             auditUID: Optional[Dict[str, str]] = None,
             annotationComplete: Optional[Dict[str, str]] = None,
             imageLabels: Optional[List[str]] = None,
             **kwargs: Any,
-        ) -> Dict[str, Any]:
-            if metadata is not None:
-                tile["fileInfo"].update(metadata)
+        ) -> None:
+            if fileInfo is not None:
+                tile["fileInfo"].update(fileInfo)
             if annotationUID is not None:
                 tile["annotationUID"].update(annotationUID)
             if auditUID is not None:
@@ -612,31 +783,32 @@ class Gliff:
                     tile["annotationComplete"] = {}
                 tile["annotationComplete"].update(annotationComplete)
             if imageLabels is not None:
-                tile["imageLabels"] = imageLabels
-            return tile
+                tile["imageLabels"] = list(imageLabels)
 
-        logger.info("updating gallery's tile..")
+        logger.info("updating gallery's tiles..")
 
         try:
-            gallery = self._get_gallery()
-
-            tile_index = self._find_gallery_tile(gallery, item_uid)
-
-            gallery[tile_index] = update_tile({**gallery[tile_index]}, **tile_data)
-
-            self._set_gallery(gallery)
+            with self._with_gallery() as gallery:
+                for item_uid, tile_data in tile_updates:
+                    tile_index = self._find_gallery_tile(gallery, item_uid)
+                    if tile_index is None:
+                        # skip this tile only, so that the other updates in the batch are still saved
+                        logger.error("No gallery tile for image item, uid: {}.", item_uid)
+                        continue
+
+                    update_tile(gallery[tile_index], **tile_data)
         except Exception as e:
-            logger.error(f"Error while updating a gallery's tile: {e}")
+            logger.error(f"Error while updating the gallery's tiles: {e}")
 
-        logger.info("updated gallery's tile")
+        logger.info("updated gallery's tiles")
 
     def upload_image(
         self,
         project_uid: str,
         name: str,
         image: Union[str, Image.Image],
-        image_labels: List[str] = [],
-        metadata: Dict[str, Any] = {},
+        image_labels: Optional[List[str]] = None,
+        metadata: Optional[Dict[str, Any]] = None,
     ) -> Union[str, None]:
         """Create, encrypt and upload a new item to the STORE project.
 
@@ -662,14 +834,102 @@ class Gliff:
         if not self._has_project():
             return None
 
-        self.project._fetch_project_data(project_uid)
+        self._ensure_project(project_uid)
+
+        image_item = self._create_image_item(name, image, image_labels, metadata)
+        if image_item is None:
+            return None
+
+        item, new_tile = image_item
+        self.project.item_manager.transaction([item])
+
+        logger.success("image item created.")
+
+        # add the new tile to the project's content (or gallery)
+        self._create_gallery_tile(new_tile)
+
+        return item.uid
+
+    def upload_images(self, project_uid: str, images: List[Dict[str, Any]]) -> Union[List[str], None]:
+        """Create, encrypt and upload several new items to the STORE project, using a single
+        transaction for the items and a single update of the gallery.
+
+        Parameters
+        ----------
+        project_uid: str
+            Project's uid.
+        images: List[Dict]
+            The arguments of upload_image (name, image and, optionally, image_labels and metadata)
+            for each image to upload.
+        Returns
+        -------
+        item_uids: Union[List[str], None]
+            New image items' uids.
+        """
+
+        logger.info("creating new image items...")
+
+        if not self._has_project():
+            return None
+
+        if not images:
+            return []
+
+        self._ensure_project(project_uid)
+
+        items: List[Item] = []
+        new_tiles: List[Dict[str, Any]] = []
+        for image in images:
+            image_item = self._create_image_item(**image)
+            if image_item is None:
+                return None
+            items.append(image_item[0])
+            new_tiles.append(image_item[1])
+
+        self.project.item_manager.transaction(items)
+
+        logger.success(f"{len(items)} image items created.")
+
+        try:
+            with self._with_gallery():
+                for new_tile in new_tiles:
+                    self._create_gallery_tile(new_tile)
+        except Exception as e:
+            logger.error(f"Error while creating the gallery's tiles: {e}")
+
+        return [item.uid for item in items]
+
+    def _create_image_item(
+        self,
+        name: str,
+        image: Union[str, Image.Image],
+        image_labels: Optional[List[str]] = None,
+        metadata: Optional[Dict[str, Any]] = None,
+    ) -> Union[Tuple[Item, Dict[str, Any]], None]:
+        """Process an image and create a new image item and its gallery tile, without uploading them.
+
+        Parameters
+        ----------
+        name: str
+            Name of the new item.
+        image: Union[str, Image.Image]
+            2D image to upload to the new item.
+        image_labels: List[str]
+            Image labels (optional).
+        metadata: Dict
+            Metadata (optional).
+        Returns
+        -------
+        image_item: Union[Tuple[Item, Dict], None]
+            New image item and gallery tile.
+        """
 
         # process the input image
         image_data = self._process_image_data(image)
         if image_data is None:
             return None
 
-        # create a new gliff.image item and upload it to the project
+        # create a new gliff.image item
         ctime = self.get_current_time()
         item_metadata = {
             "type": "gliff.image",
@@ -679,11 +939,8 @@ class Gliff:
         }
 
         item = self.project.item_manager.create(item_metadata, image_data["encoded_image"])
-        self.project.item_manager.transaction([item])
 
-        logger.success("image item created.")
-
-        # create a new tile and add this to the project's content (or gallery)
+        # create a new tile for the project's content (or gallery)
         new_tile = self._create_new_tile(
             item.uid,
             image_data["thumbnail"],
@@ -692,13 +949,11 @@ class Gliff:
                 "imageName": name,
                 "width": image_data["width"],
                 "height": image_data["height"],
-                **metadata,
+                **(metadata or {}),
             },
         )
 
-        self._create_gallery_tile(new_tile)
-
-        return item.uid
+        return item, new_tile
 
     def update_metadata_and_labels(
         self,
@@ -726,19 +981,20 @@ class Gliff:
         if (not metadata and not image_labels) or not self._has_project():
             return None
 
-        self.project._fetch_project_data(project_uid)
-
-        item = self.get_project_item(project_uid, item_uid)
+        # get_project_item fetches the project's data too; the image itself is not needed
+        item = self.get_project_item(project_uid, item_uid, metadata_only=True)
 
-        item.meta = {
-            **item.meta,
-            "modifiedTime": self.get_current_time(),
-        }
+        # the gallery is only saved once the item's transaction has succeeded
+        with self._with_gallery():
+            # Item.meta returns a copy of the metadata, so it has to be assigned back
+            item_meta = item.meta
+            item_meta["modifiedTime"] = self.get_current_time()
+            item.meta = item_meta
 
-        self.project.item_manager.transaction([item])
+            self.project.item_manager.transaction([item])
 
-        tile_data = self._create_tile_update(image_labels=image_labels, metadata=metadata)
-        self._update_gallery_tile(item_uid, tile_data)
+            tile_data = self._create_tile_update(image_labels=image_labels, metadata=metadata)
+            self._update_gallery_tile(item_uid, tile_data)
 
         logger.success("metadata updated.")
 
@@ -760,7 +1016,7 @@ class Gliff:
         if not self._has_project():
             return None
 
-        self.project._fetch_project_data(project_uid)
+        self._ensure_project(project_uid)
 
         logger.info(f"fetching item's image data, uid: {item_uid}...")
 
@@ -768,19 +1024,20 @@ class Gliff:
             item = self.get_project_item(project_uid, item_uid)
             decoded_content = self._decode_content(item.content)
 
-            image_data: List[List[Image.Image]] = []
-            for i_slice in range(len(decoded_content)):
-                image_data.append([])
-                for i_channel in range(len(decoded_content[i_slice])):
-                    image_data[i_slice].append(self.base64_to_pil_image(decoded_content[i_slice][i_channel]))
+            # only the first slice is returned, so the other slices are not decoded
+            channels = [base64.b64decode(channel) for channel in decoded_content[0]]
 
-            num_channels = len(image_data[0])
+            num_channels = len(channels)
             if num_channels == 1:
-                image_pil = image_data[0][0]
+                image_pil = Image.open(BytesIO(channels[0])).convert("RGB")
 
             elif num_channels == 3:
-                red, green, blue = [img.getchannel(i) for i, img in enumerate(image_data[0])]
-                image_pil = Image.merge("RGB", (red, green, blue))
+                # merge single-band images directly, rather than expanding each channel to RGB first
+                bands = []
+                for i, channel in enumerate(channels):
+                    img = Image.open(BytesIO(channel))
+                    bands.append(img if img.mode == "L" else img.convert("RGB").getchannel(i))
+                image_pil = Image.merge("RGB", bands)
 
             else:
                 logger.error(f"Images with {num_channels} channels are not supported.")
@@ -812,14 +1069,15 @@ class Gliff:
         if not self._has_project():
             return None
 
-        self.project._fetch_project_data(project_uid)
+        self._ensure_project(project_uid)
 
         try:
             gallery = self._get_gallery()
 
             index = self._find_gallery_tile(gallery, item_uid)
 
-            return gallery[index]["fileInfo"], gallery[index]["imageLabels"]
+            # copies, so that callers cannot change the cached gallery
+            return dict(gallery[index]["fileInfo"]), list(gallery[index]["imageLabels"])
 
         except Exception as e:
             logger.error(f"error while retrieving image item's metadata: {e}")
@@ -845,54 +1103,46 @@ class Gliff:
         if not self._has_project():
             return None
 
-        self.project._fetch_project_data(project_uid)
+        self._ensure_project(project_uid)
 
         gallery = self._get_gallery()
 
-        item_uid = None
-        for tile in gallery:
-            if tile["id"] == image_item_uid:
-                if username in tile["annotationUID"]:
-                    item_uid = tile["annotationUID"][username]
-                    break
-        return item_uid
+        index = self._find_gallery_tile(gallery, image_item_uid)
+        if index is None:
+            return None
+        return gallery[index]["annotationUID"].get(username)
 
     def _create_annotation_item(
         self,
-        project_uid: str,
-        image_item_uid: str,
         username: str,
         annotations: List[Dict[str, Any]],
-        metadata: Dict[str, Any] = {},
-    ) -> str:
-        """Create, encrypt and upload a new item to the STORE project.
+        metadata: Optional[Dict[str, Any]] = None,
+        now: Optional[int] = None,
+    ) -> Tuple[Item, Dict[str, Any]]:
+        """Create a new annotation item and the update for the gallery tile of the annotated image,
+        without uploading them.
 
         Parameters
         ----------
-        project_uid: str
-            Project's uid.
-        image_item_uid: str
-            Image item's uid.
         username: str
             Identifier for the user who makes the annotation.
         annotations: List[Dict]
             Annotation data.
         metadata: Dict
             Metadata (optional).
+        now: int
+            Creation time, e.g. shared by a batch of items (optional, defaults to the current time).
         Returns
         -------
-        item_uid: str
-            New annotation item's uid.
+        item: Item
+            New annotation item.
+        tile_data: Dict
+            Gallery tile data.
         """
 
         logger.info("creating new annotation item...")
 
-        if not self._has_project():
-            return None
-
-        self.project._fetch_project_data(project_uid)
-
-        ctime = self.get_current_time()
+        ctime = now if now is not None else self.get_current_time()
         item_metadata = {
             "type": "gliff.annotation",
             "createdTime": ctime,
@@ -903,73 +1153,66 @@ class Gliff:
         item_content = self._encode_content(annotations)
 
         item: Item = self.project.item_manager.create(item_metadata, item_content)
-        self.project.item_manager.transaction([item])
-
-        logger.success("annotation item created.")
 
         tile_data = self._create_tile_update(
             metadata=metadata, annotation_uid={username: item.uid}, annotation_complete={username: False}
         )
-        self._update_gallery_tile(image_item_uid, tile_data)
 
-        return item.uid
+        return item, tile_data
 
     def _update_annotation_item(
         self,
-        project_uid: str,
-        image_item_uid: str,
-        annotation_item_uid: str,
+        item: Item,
         annotations: List[Dict[str, Any]],
-        metadata: Dict[str, Any] = {},
-    ) -> str:
-        """Create, encrypt and upload a new item to the STORE project.
+        metadata: Optional[Dict[str, Any]] = None,
+        now: Optional[int] = None,
+    ) -> Tuple[Item, Union[Dict[str, Any], None]]:
+        """Add annotations to an annotation item and create the update for the gallery tile of the annotated
+        image, without uploading them.
 
         Parameters
         ----------
-        project_uid: str
-            Project's uid.
-        image_item_uid: str
-            Image item's uid.
-        annotation_item_uid: str
-            Uid for annotation to update.
+        item: Item
+            Annotation item to update, already fetched.
         annotations: List[Dict]
             Annotations data.
         metadata: Dict
             Metadata (optional).
+        now: int
+            Modification time, e.g. shared by a batch of items (optional, defaults to the current time).
 
         Returns
         -------
-        item_uid: str
-            Annotation item's uid.
+        item: Item
+            Updated annotation item.
+        tile_data: Union[Dict, None]
+            Gallery tile data, if there is metadata to update.
         """
 
-        if not self._has_project():
-            return None
+        # formatted by loguru only if the message is emitted
+        logger.info("updating annotation item, uid: {}...", item.uid)
 
-        self.project._fetch_project_data(project_uid)
-
-        logger.info(f"updating annotation item, uid: {annotation_item_uid}...")
-
-        item = self.get_project_item(project_uid, annotation_item_uid)
-
-        # if the last annotation is empty, remove it
-        prev_annotations = self._decode_content(item.content)
-        if len(prev_annotations) > 0 & self.is_empty_annotation(prev_annotations[-1]):
+        # remove the trailing empty annotations
+        prev_content = item.content
+        prev_annotations = self._decode_content(prev_content)
+        num_prev_annotations = len(prev_annotations)
+        while prev_annotations and self.is_empty_annotation(prev_annotations[-1]):
             prev_annotations.pop()
 
-        item.meta = {**item.meta, "modifiedTime": self.get_current_time()}
-
-        item.content = self._encode_content([*prev_annotations, *annotations])
-
-        self.project.item_manager.transaction([item])
+        item_meta = item.meta
+        item_meta["modifiedTime"] = now if now is not None else self.get_current_time()
+        item.meta = item_meta
 
-        logger.success("annotation item updated.")
+        if prev_annotations and len(prev_annotations) == num_prev_annotations:
+            # nothing was removed, so only the new annotations need encoding
+            item.content = self._encode_appended_content(prev_content, annotations)
+        else:
+            prev_annotations.extend(annotations)
+            item.content = self._encode_content(prev_annotations)
 
-        if metadata:
-            tile_data = self._create_tile_update(metadata=metadata)
-            self._update_gallery_tile(image_item_uid, tile_data)
+        tile_data = self._create_tile_update(metadata=metadata) if metadata else None
 
-        return item.uid
+        return item, tile_data
 
     def upload_annotation(
         self,
@@ -977,8 +1220,8 @@ class Gliff:
         image_item_uid: str,
         username: str,
         annotations: List[Dict[str, Any]],
-        metadata: Dict[str, Any] = {},
-    ) -> str:
+        metadata: Optional[Dict[str, Any]] = None,
+    ) -> Union[str, None]:
         """Encrypt and upload an annotation to the STORE project.
 
         Parameters
@@ -995,21 +1238,106 @@ class Gliff:
             Metadata (optional).
         Returns
         -------
-        item_uid: str
+        item_uid: Union[str, None]
             Annotation item's uid.
         """
 
-        annotation_item_uid = self._get_annotation_uid(project_uid, image_item_uid, username)
+        item_uids = self.upload_annotations_bulk(
+            project_uid,
+            [
+                {
+                    "image_item_uid": image_item_uid,
+                    "username": username,
+                    "annotations": annotations,
+                    "metadata": metadata,
+                }
+            ],
+        )
+        return item_uids[0] if item_uids else None
 
-        if annotation_item_uid is None:
-            annotation_item_uid = self._create_annotation_item(
-                project_uid, image_item_uid, username, annotations=annotations, metadata=metadata
-            )
-        else:
-            self._update_annotation_item(
-                project_uid, image_item_uid, annotation_item_uid, annotations=annotations, metadata=metadata
-            )
-        return annotation_item_uid
+    def upload_annotations_bulk(
+        self, project_uid: str, entries: List[Dict[str, Any]]
+    ) -> Union[List[Union[str, None]], None]:
+        """Encrypt and upload annotations for several images to the STORE project, using a single
+        transaction for the annotation items and a single update of the gallery.
+
+        Parameters
+        ----------
+        project_uid: str
+            Project's uid.
+        entries: List[Dict]
+            The arguments of upload_annotation (image_item_uid, username, annotations and, optionally,
+            metadata) for each annotation to upload.
+        Returns
+        -------
+        item_uids: Union[List[Union[str, None]], None]
+            Annotation items' uids, one for each entry (None for entries whose image has no gallery tile).
+        """
+
+        if not self._has_project():
+            return None
+
+        if not entries:
+            return []
+
+        self._ensure_project(project_uid)
+
+        # entries for the same image and user go to the same annotation item; entries for images without
+        # a gallery tile are skipped, as their annotation item could not be linked to the image
+        gallery = self._get_gallery()
+        grouped_entries: Dict[Tuple[str, str], Dict[str, Any]] = {}
+        for entry in entries:
+            if self._find_gallery_tile(gallery, entry["image_item_uid"]) is None:
+                logger.error("No gallery tile for image item, uid: {}.", entry["image_item_uid"])
+                continue
+            key = entry["image_item_uid"], entry["username"]
+            if key not in grouped_entries:
+                grouped_entries[key] = {"annotations": [], "metadata": {}}
+            grouped_entries[key]["annotations"].extend(entry["annotations"])
+            grouped_entries[key]["metadata"].update(entry.get("metadata") or {})
+
+        annotation_item_uids = {key: self._get_annotation_uid(project_uid, *key) for key in grouped_entries}
+
+        # fetch all the existing annotation items with a single request
+        existing_uids = [uid for uid in annotation_item_uids.values() if uid is not None]
+        existing_items: Dict[str, Item] = {}
+        if existing_uids:
+            logger.info("fetching {} annotation items...", len(existing_uids))
+            existing_items = {item.uid: item for item in self.project.item_manager.fetch_multi(existing_uids).data}
+            logger.info("annotation items fetched.")
+
+        # all the items in the transaction share the same creation or modification time
+        now = self.get_current_time()
+        items: Dict[Tuple[str, str], Item] = {}
+        tile_updates: List[Tuple[str, Dict[str, Any]]] = []
+        for (image_item_uid, username), entry in grouped_entries.items():
+            annotation_item_uid = annotation_item_uids[image_item_uid, username]
+            tile_data: Optional[Dict[str, Any]]
+            if annotation_item_uid is None:
+                item, tile_data = self._create_annotation_item(
+                    username, entry["annotations"], entry["metadata"], now=now
+                )
+            else:
+                item, tile_data = self._update_annotation_item(
+                    existing_items[annotation_item_uid], entry["annotations"], entry["metadata"], now=now
+                )
+            items[image_item_uid, username] = item
+            if tile_data is not None:
+                tile_updates.append((image_item_uid, tile_data))
+
+        if items:
+            self.project.item_manager.transaction(list(items.values()))
+
+            logger.debug("annotation items uploaded.")
+
+        if tile_updates:
+            self._update_gallery_tiles_bulk(tile_updates)
+
+        item_uids: List[Union[str, None]] = []
+        for entry in entries:
+            item = items.get((entry["image_item_uid"], entry["username"]))
+            item_uids.append(item.uid if item is not None else None)
+        return item_uids
 
     def get_annotations(
         self, project_uid: str, image_item_uid: str, username: str
@@ -1033,16 +1361,56 @@ class Gliff:
         if not self._has_project():
             return None
 
-        self.project._fetch_project_data(project_uid)
+        self._ensure_project(project_uid)
 
-        try:
-            annotation_item_uid = self._get_annotation_uid(project_uid, image_item_uid, username)
-            if annotation_item_uid is not None:
-                item = self.get_project_item(project_uid, annotation_item_uid)
-                return self._decode_content(item.content)
-        except Exception as e:
-            logger.error(f"Error while fetching an item's annotations: {e}")
-        return None
+        annotation_item_uid = self._get_annotation_uid(project_uid, image_item_uid, username)
+        if annotation_item_uid is None:
+            return None
+
+        # fetching errors are logged by get_project_item
+        item = self.get_project_item(project_uid, annotation_item_uid)
+        if item is None:
+            return None
+        return self._decode_content(item.content)
+
+    def iter_annotations(self, project_uid: str, image_item_uid: str, username: str) -> Iterator[Dict[str, Any]]:
+        """Iterate over the annotations from an annotation item. When ijson is installed, annotations are
+        decoded one at a time, so this is preferable to get_annotations for long annotation histories
+        or when only some of the annotations are needed.
+
+        Parameters
+        ----------
+        project_uid: str
+            Project's uid.
+        image_item_uid: str
+            Image item's uid.
+        username: str
+            Identifier for the user who makes the annotation.
+        Yields
+        ------
+        annotation: Dict
+            Annotation data.
+        """
+
+        if not self._has_project():
+            return
+
+        self._ensure_project(project_uid)
+
+        annotation_item_uid = self._get_annotation_uid(project_uid, image_item_uid, username)
+        if annotation_item_uid is None:
+            return
+
+        item = self.get_project_item(project_uid, annotation_item_uid)
+        if item is None:
+            return
+        if ijson is not None:
+            yield from ijson.items(BytesIO(item.content), "item", use_float=True)
+        else:
+            yield from self._decode_content(item.content)
+
+    def __enter__(self) -> "Gliff":
+        return self
 
-    def __del__(self) -> None:
+    def __exit__(self, *exc_info: Any) -> None:
         self.logout()